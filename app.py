@@ -2,6 +2,7 @@ import os
 import logging
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
 
@@ -28,10 +29,51 @@ app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
 # Initialize the app with the extension
 db.init_app(app)
 
-# Configure upload folders
-app.config['DOWNLOAD_FOLDER'] = os.path.join(os.getcwd(), 'downloads')
-app.config['PREVIEW_FOLDER'] = os.path.join(os.getcwd(), 'previews')
+# Let download workers in other processes write while the web app reads
+if app.config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite"):
+    with app.app_context():
+        @event.listens_for(db.engine, "connect")
+        def set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA busy_timeout=30000")
+            cursor.close()
+
+# Configure upload folders. When download workers run on other machines,
+# DOWNLOAD_FOLDER must be shared storage mounted at the same path everywhere.
+app.config['DOWNLOAD_FOLDER'] = os.environ.get("DOWNLOAD_FOLDER", os.path.join(os.getcwd(), 'downloads'))
+app.config['PREVIEW_FOLDER'] = os.environ.get("PREVIEW_FOLDER", os.path.join(os.getcwd(), 'previews'))
 app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # 500MB max file size
+app.config['DOWNLOAD_MIN_CHUNK_SIZE'] = int(os.environ.get("DOWNLOAD_MIN_CHUNK_SIZE", str(64 * 1024)))
+app.config['DOWNLOAD_MAX_CHUNK_SIZE'] = int(os.environ.get("DOWNLOAD_MAX_CHUNK_SIZE", str(4 * 1024 * 1024)))
+
+# Completed files are served through wsgi.file_wrapper, which gunicorn sends with
+# os.sendfile. Behind nginx/Apache set USE_X_SENDFILE to hand the file off entirely.
+app.config['USE_X_SENDFILE'] = os.environ.get("USE_X_SENDFILE", "").lower() in ("1", "true", "yes")
+
+# Configure the shared HTTP client
+app.config['HTTP_POOL_HOSTS'] = int(os.environ.get("HTTP_POOL_HOSTS", "32"))  # Hosts with a cached pool
+app.config['HTTP_POOL_MAXSIZE'] = int(os.environ.get("HTTP_POOL_MAXSIZE", "16"))  # Keep-alive connections per host
+app.config['HTTP_CONNECT_TIMEOUT'] = float(os.environ.get("HTTP_CONNECT_TIMEOUT", "5"))
+app.config['HTTP_READ_TIMEOUT'] = float(os.environ.get("HTTP_READ_TIMEOUT", "30"))
+app.config['HTTP_DNS_CACHE_TTL'] = int(os.environ.get("HTTP_DNS_CACHE_TTL", "300"))  # 0 disables the cache
+app.config['HTTP_DNS_CACHE_SIZE'] = int(os.environ.get("HTTP_DNS_CACHE_SIZE", "1024"))  # Lookups kept before evicting
+app.config['ADMIN_TOKEN'] = os.environ.get("ADMIN_TOKEN")
+
+# Configure per-host health tracking
+app.config['HOST_FAILURE_THRESHOLD'] = int(os.environ.get("HOST_FAILURE_THRESHOLD", "3"))  # Consecutive failures before the breaker opens
+app.config['HOST_BREAKER_COOLDOWN'] = float(os.environ.get("HOST_BREAKER_COOLDOWN", "60"))  # Seconds before a probe is let through
+app.config['HOST_LATENCY_WINDOW'] = int(os.environ.get("HOST_LATENCY_WINDOW", "100"))
+app.config['HOST_MIN_SAMPLES'] = int(os.environ.get("HOST_MIN_SAMPLES", "5"))  # Samples needed before timeouts adapt
+app.config['HOST_MIN_TIMEOUT'] = float(os.environ.get("HOST_MIN_TIMEOUT", "1"))
+app.config['HOST_TIMEOUT_MULTIPLIER'] = float(os.environ.get("HOST_TIMEOUT_MULTIPLIER", "4"))  # Timeout = p99 latency x this
+
+# Configure the download worker queue
+app.config['DOWNLOAD_LEASE_SECONDS'] = int(os.environ.get("DOWNLOAD_LEASE_SECONDS", "60"))
+app.config['DOWNLOAD_HEARTBEAT_SECONDS'] = int(os.environ.get("DOWNLOAD_HEARTBEAT_SECONDS", "15"))
+app.config['DOWNLOAD_MAX_ATTEMPTS'] = int(os.environ.get("DOWNLOAD_MAX_ATTEMPTS", "5"))
+app.config['DOWNLOAD_RETRY_BASE_SECONDS'] = int(os.environ.get("DOWNLOAD_RETRY_BASE_SECONDS", "5"))
+app.config['DOWNLOAD_RETRY_MAX_SECONDS'] = int(os.environ.get("DOWNLOAD_RETRY_MAX_SECONDS", "900"))
 
 # Create directories if they don't exist
 os.makedirs(app.config['DOWNLOAD_FOLDER'], exist_ok=True)
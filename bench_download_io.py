@@ -0,0 +1,115 @@
+"""Benchmark the download write path against the old 8 KB iter_content loop.
+
+Serves a large file from a local HTTP server running in a separate process
+(so its CPU time is not counted), downloads it repeatedly with both write
+paths and reports throughput and client CPU time per GB:
+
+    python bench_download_io.py --size-mb 256 --runs 5
+"""
+import argparse
+import os
+import resource
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+def legacy_download(session, url, file_path):
+    """The write loop FileDownloader used before the readinto path"""
+    response = session.get(url, stream=True, timeout=30)
+    response.raise_for_status()
+    with open(file_path, 'wb') as f:
+        for chunk in response.iter_content(chunk_size=8192):
+            if chunk:
+                f.write(chunk)
+    return file_path
+
+def optimized_download(downloader, url, file_path):
+    response = downloader.session.get(url, stream=True, timeout=downloader.http.timeout())
+    response.raise_for_status()
+    return downloader._write_response(response, file_path)
+
+def cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+def measure(download, url, file_path, size, runs):
+    """Return the median MB/s and CPU seconds per GB over several runs"""
+    rates, cpu_per_gb = [], []
+    for _ in range(runs):
+        start_wall, start_cpu = time.perf_counter(), cpu_seconds()
+        path = download(url, file_path)
+        wall, cpu = time.perf_counter() - start_wall, cpu_seconds() - start_cpu
+
+        if os.path.getsize(path) != size:
+            raise RuntimeError(f"Downloaded {os.path.getsize(path)} bytes, expected {size}")
+        os.unlink(path)
+
+        rates.append(size / wall / (1024 * 1024))
+        cpu_per_gb.append(cpu / (size / (1024 ** 3)))
+    return statistics.median(rates), statistics.median(cpu_per_gb)
+
+def wait_for_port(port, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Server on port {port} did not start")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the download write path')
+    parser.add_argument('--size-mb', type=int, default=256, help='Size of the served file in MB')
+    parser.add_argument('--runs', type=int, default=5, help='Downloads per write path')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_download_io_')
+    serve_dir = os.path.join(workdir, 'serve')
+    os.makedirs(serve_dir)
+    size = args.size_mb * 1024 * 1024
+    with open(os.path.join(serve_dir, 'payload.bin'), 'wb') as f:
+        for _ in range(args.size_mb):
+            f.write(os.urandom(1024 * 1024))
+
+    # The app reads its configuration at import time, so set it up before importing
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.chdir(workdir)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from app import app
+    from downloader import FileDownloader
+
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    server = subprocess.Popen([sys.executable, '-m', 'http.server', str(port), '--bind', '127.0.0.1',
+                               '--directory', serve_dir], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    try:
+        wait_for_port(port)
+        url = f"http://127.0.0.1:{port}/payload.bin"
+        target = os.path.join(app.config['DOWNLOAD_FOLDER'], 'payload.bin')
+
+        with app.app_context():
+            downloader = FileDownloader()
+            paths = [
+                ('8 KB iter_content', lambda u, p: legacy_download(downloader.session, u, p)),
+                ('readinto + fallocate', lambda u, p: optimized_download(downloader, u, p)),
+            ]
+
+            print(f"{args.size_mb} MB file, median of {args.runs} runs")
+            print(f"{'write path':<22} {'MB/s':>8} {'CPU s/GB':>9}")
+            for name, download in paths:
+                rate, cpu_per_gb = measure(download, url, target, size, args.runs)
+                print(f"{name:<22} {rate:>8.1f} {cpu_per_gb:>9.2f}")
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
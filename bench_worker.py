@@ -0,0 +1,146 @@
+"""Benchmark download throughput as the number of worker processes grows.
+
+Serves synthetic files from a local HTTP server that adds a fixed latency per
+request (simulating a slow origin), queues a batch of downloads and times how
+long 1, 2, 4, ... worker processes take to drain the queue. Workers are
+started before the jobs are queued so interpreter start-up is not counted:
+
+    python bench_worker.py --jobs 200 --latency 0.1 --workers 1 2 4 8
+
+Pass --database-url to benchmark against PostgreSQL instead of a temporary
+SQLite database. Workers on other machines can join the run by pointing
+`python worker.py --exit-when-idle` at the same database.
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def make_handler(file_size, latency):
+    payload = os.urandom(file_size)
+
+    class SlowOriginHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return SlowOriginHandler
+
+def seed_jobs(jobs, base_url):
+    """Create a fresh analysis with one queued download per job"""
+    from app import app, db
+    from models import AnalysisSession, DetectedFile, DownloadJob
+    from download_queue import DownloadQueue
+
+    with app.app_context():
+        DownloadJob.query.delete()
+        DetectedFile.query.delete()
+        AnalysisSession.query.delete()
+
+        analysis = AnalysisSession(url=base_url, session_id='bench', status='completed')
+        db.session.add(analysis)
+        db.session.flush()
+
+        files = []
+        for i in range(jobs):
+            detected_file = DetectedFile(session_id=analysis.id, filename=f"file_{i}.bin",
+                                         url=f"{base_url}/file_{i}.bin", file_type='other')
+            db.session.add(detected_file)
+            files.append(detected_file)
+        db.session.commit()
+
+        DownloadQueue().enqueue_many(files)
+
+def count_completed():
+    from app import app
+    from models import DownloadJob
+
+    with app.app_context():
+        return DownloadJob.query.filter_by(status='completed').count()
+
+def count_finished():
+    from app import app
+    from models import DownloadJob
+
+    with app.app_context():
+        return DownloadJob.query.filter(DownloadJob.status.in_(['completed', 'failed'])).count()
+
+def run_workers(count, jobs, base_url, workdir, env, warmup):
+    """Start worker processes, queue the jobs once they are up and time how long they take to drain"""
+    worker_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'worker.py')
+    seed_jobs(0, base_url)
+    processes = [
+        subprocess.Popen([sys.executable, worker_script, '--poll-interval', '0.05'], cwd=workdir, env=env,
+                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        for _ in range(count)
+    ]
+
+    try:
+        # Keep interpreter start-up out of the measurement
+        time.sleep(warmup * count)
+
+        start = time.perf_counter()
+        seed_jobs(jobs, base_url)
+        while count_finished() < jobs:
+            time.sleep(0.05)
+        return time.perf_counter() - start
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark download worker scaling')
+    parser.add_argument('--jobs', type=int, default=200, help='Downloads to queue per run')
+    parser.add_argument('--latency', type=float, default=0.1, help='Origin latency per request in seconds')
+    parser.add_argument('--file-size', type=int, default=256 * 1024, help='Size of each file in bytes')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8], help='Worker counts to try')
+    parser.add_argument('--warmup', type=float, default=1.5, help='Seconds per worker to wait for start-up')
+    parser.add_argument('--database-url', default=None, help='Database to use (default: temporary SQLite)')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_worker_')
+    database_url = args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+
+    # The app reads its configuration at import time, so set it up before importing
+    os.environ['DATABASE_URL'] = database_url
+    os.chdir(workdir)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, DATABASE_URL=database_url)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(args.file_size, args.latency))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    print(f"{args.jobs} jobs, {args.file_size} bytes each, {args.latency * 1000:.0f} ms origin latency")
+    print(f"{'workers':>8} {'seconds':>9} {'jobs/s':>9} {'speedup':>8} {'completed':>10}")
+
+    baseline = None
+    try:
+        for count in args.workers:
+            elapsed = run_workers(count, args.jobs, base_url, workdir, env, args.warmup)
+            throughput = args.jobs / elapsed
+            baseline = baseline or throughput
+            print(f"{count:>8} {elapsed:>9.2f} {throughput:>9.1f} {throughput / baseline:>7.2f}x "
+                  f"{count_completed():>10}")
+            shutil.rmtree(os.path.join(workdir, 'downloads'), ignore_errors=True)
+            os.makedirs(os.path.join(workdir, 'downloads'), exist_ok=True)
+    finally:
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
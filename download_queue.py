@@ -0,0 +1,270 @@
+import os
+import logging
+import random
+from datetime import timedelta
+from sqlalchemy import select, update, func, type_coerce, or_, and_
+from sqlalchemy.exc import IntegrityError
+from app import app, db
+from models import DetectedFile, DownloadJob
+
+class DownloadQueue:
+    """Database-backed queue of download jobs shared by the web app and workers"""
+
+    def __init__(self):
+        self.lease_seconds = app.config['DOWNLOAD_LEASE_SECONDS']
+        self.max_attempts = app.config['DOWNLOAD_MAX_ATTEMPTS']
+        self.retry_base_seconds = app.config['DOWNLOAD_RETRY_BASE_SECONDS']
+        self.retry_max_seconds = app.config['DOWNLOAD_RETRY_MAX_SECONDS']
+
+        # Number of candidate rows a lease-based claim tries before giving up
+        self.claim_batch_size = 8
+
+    def is_ready(self, detected_file):
+        """Return True if the file has been downloaded and is on disk"""
+        return (detected_file.download_status == 'completed'
+                and bool(detected_file.download_path)
+                and os.path.exists(detected_file.download_path))
+
+    def enqueue(self, detected_file):
+        """Queue a file for download, re-queueing failed jobs"""
+        try:
+            job = self._add_job(detected_file, requeue_failed=True, now=self._db_now(db.session))
+            db.session.commit()
+            return job
+        except IntegrityError:
+            # Another request queued the same file first
+            db.session.rollback()
+            return DownloadJob.query.filter_by(file_id=detected_file.id).first()
+
+    def enqueue_many(self, files):
+        """Queue every file that is not yet downloaded and return how many are outstanding.
+
+        Files whose job has permanently failed, or completed without the file
+        being visible here, are left alone so that callers waiting for the
+        batch to drain are not blocked forever.
+        """
+        outstanding = [f for f in files if not self.is_ready(f)
+                       and not (f.download_job and f.download_job.status in ('failed', 'completed'))]
+
+        try:
+            now = self._db_now(db.session)
+            for detected_file in outstanding:
+                self._add_job(detected_file, requeue_failed=False, now=now)
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            for detected_file in outstanding:
+                self.enqueue(detected_file)
+
+        return len(outstanding)
+
+    def claim(self, worker_id):
+        """Claim the next runnable job for a worker, or return None if there is none"""
+        if db.engine.dialect.name == 'postgresql':
+            return self._claim_skip_locked(worker_id)
+        return self._claim_with_lease(worker_id)
+
+    def heartbeat(self, job_id, worker_id):
+        """Extend the lease on a running job. Returns False if the lease was lost."""
+        with db.engine.begin() as conn:
+            now = self._db_now(conn)
+            result = conn.execute(
+                update(DownloadJob.__table__)
+                .where(DownloadJob.id == job_id, DownloadJob.lease_owner == worker_id,
+                       DownloadJob.status == 'running')
+                .values(heartbeat_at=now, lease_expires_at=now + timedelta(seconds=self.lease_seconds))
+            )
+        return result.rowcount == 1
+
+    def complete(self, job, worker_id, download_path):
+        """Mark a job and its file as completed if the worker still holds the lease.
+
+        Returns False if another worker took the job over; the caller's copy of
+        the file is then not referenced by anything.
+        """
+        result = db.session.execute(
+            update(DownloadJob)
+            .where(DownloadJob.id == job.id, DownloadJob.lease_owner == worker_id)
+            .values(status='completed', lease_owner=None, lease_expires_at=None, last_error=None)
+            .execution_options(synchronize_session=False)
+        )
+
+        if result.rowcount != 1:
+            db.session.rollback()
+            logging.warning(f"Worker {worker_id} lost the lease on download job {job.id} before completing it")
+            return False
+
+        # Same transaction as the lease check, so only the lease holder's copy is recorded
+        db.session.execute(
+            update(DetectedFile)
+            .where(DetectedFile.id == job.file_id)
+            .values(download_status='completed', download_path=download_path)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        return True
+
+    def fail(self, job, worker_id, error_message, retry=True):
+        """Record a failed attempt, scheduling a retry with exponential backoff when allowed"""
+        db.session.rollback()
+
+        now = self._db_now(db.session)
+        retry = retry and job.attempts < job.max_attempts
+        values = {
+            'lease_owner': None,
+            'lease_expires_at': None,
+            'last_error': error_message,
+        }
+
+        if retry:
+            values['status'] = 'queued'
+            values['next_attempt_at'] = now + timedelta(seconds=self._backoff_seconds(job.attempts))
+        else:
+            values['status'] = 'failed'
+
+        result = db.session.execute(
+            update(DownloadJob)
+            .where(DownloadJob.id == job.id, DownloadJob.lease_owner == worker_id)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+
+        if result.rowcount == 1:
+            db.session.execute(
+                update(DetectedFile)
+                .where(DetectedFile.id == job.file_id)
+                .values(download_status='queued' if retry else 'error')
+                .execution_options(synchronize_session=False)
+            )
+        else:
+            logging.warning(f"Worker {worker_id} lost the lease on download job {job.id} before recording its failure")
+
+        db.session.commit()
+        return retry
+
+    def _add_job(self, detected_file, requeue_failed, now):
+        """Create or reset the job for a file without committing"""
+        job = detected_file.download_job
+
+        if job is None:
+            job = DownloadJob(file=detected_file, max_attempts=self.max_attempts)
+            db.session.add(job)
+        elif job.status == 'completed':
+            # A worker finished it but the file isn't visible here, so DOWNLOAD_FOLDER is
+            # probably not shared with that worker. Downloading again wouldn't fix that.
+            logging.error(f"Download job {job.id} completed but {detected_file.download_path} "
+                          f"is not available on this host; check DOWNLOAD_FOLDER is shared storage")
+            return job
+        elif job.status == 'failed' and requeue_failed:
+            job.status = 'queued'
+            job.attempts = 0
+            job.max_attempts = self.max_attempts
+            job.lease_owner = None
+            job.lease_expires_at = None
+            job.last_error = None
+        else:
+            # Already queued or running
+            return job
+
+        job.next_attempt_at = now
+        detected_file.download_status = 'queued'
+        return job
+
+    def _db_now(self, conn):
+        """Return the database's current UTC time as a naive datetime.
+
+        Lease expiry and retry times are all taken from this one clock, so a
+        worker whose system clock runs fast can't take over live leases.
+        """
+        dialect = db.engine.dialect.name
+        if dialect == 'postgresql':
+            now = func.timezone('UTC', func.now())
+        elif dialect in ('mysql', 'mariadb'):
+            now = func.utc_timestamp()
+        else:
+            # SQLite's CURRENT_TIMESTAMP is already UTC
+            now = func.current_timestamp()
+        return conn.execute(select(type_coerce(now, db.DateTime))).scalar_one()
+
+    def _claimable(self, now):
+        """Jobs that are due, plus running jobs whose worker stopped heartbeating"""
+        return or_(
+            and_(DownloadJob.status == 'queued', DownloadJob.next_attempt_at <= now),
+            and_(DownloadJob.status == 'running', DownloadJob.lease_expires_at < now),
+        )
+
+    def _claim_values(self, now, worker_id):
+        return {
+            'status': 'running',
+            'attempts': DownloadJob.attempts + 1,
+            'lease_owner': worker_id,
+            'lease_expires_at': now + timedelta(seconds=self.lease_seconds),
+            'heartbeat_at': now,
+        }
+
+    def _mark_downloading(self, job_id):
+        """Flag the claimed job's file as downloading, in the claiming transaction"""
+        db.session.execute(
+            update(DetectedFile)
+            .where(DetectedFile.id == select(DownloadJob.file_id).where(DownloadJob.id == job_id).scalar_subquery())
+            .values(download_status='downloading')
+            .execution_options(synchronize_session=False)
+        )
+
+    def _claim_skip_locked(self, worker_id):
+        """Claim a job using SELECT ... FOR UPDATE SKIP LOCKED (PostgreSQL)"""
+        now = self._db_now(db.session)
+        job_id = db.session.execute(
+            select(DownloadJob.id)
+            .where(self._claimable(now))
+            .order_by(DownloadJob.next_attempt_at, DownloadJob.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        ).scalar_one_or_none()
+
+        if job_id is None:
+            db.session.rollback()
+            return None
+
+        db.session.execute(
+            update(DownloadJob)
+            .where(DownloadJob.id == job_id)
+            .values(**self._claim_values(now, worker_id))
+            .execution_options(synchronize_session=False)
+        )
+        self._mark_downloading(job_id)
+        db.session.commit()
+        return db.session.get(DownloadJob, job_id)
+
+    def _claim_with_lease(self, worker_id):
+        """Claim a job with a conditional lease update (SQLite and other databases)"""
+        now = self._db_now(db.session)
+        candidate_ids = db.session.execute(
+            select(DownloadJob.id)
+            .where(self._claimable(now))
+            .order_by(DownloadJob.next_attempt_at, DownloadJob.id)
+            .limit(self.claim_batch_size)
+        ).scalars().all()
+
+        for job_id in candidate_ids:
+            # Only one worker's update can still match the claimable condition
+            result = db.session.execute(
+                update(DownloadJob)
+                .where(DownloadJob.id == job_id, self._claimable(now))
+                .values(**self._claim_values(now, worker_id))
+                .execution_options(synchronize_session=False)
+            )
+
+            if result.rowcount == 1:
+                self._mark_downloading(job_id)
+                db.session.commit()
+                return db.session.get(DownloadJob, job_id)
+            db.session.commit()
+
+        db.session.rollback()
+        return None
+
+    def _backoff_seconds(self, attempts):
+        """Exponential backoff with jitter so retries from many workers spread out"""
+        delay = min(self.retry_max_seconds, self.retry_base_seconds * (2 ** max(0, attempts - 1)))
+        return delay + random.uniform(0, delay * 0.1)
@@ -1,57 +1,40 @@
-import requests
 import os
 import logging
 from app import app, db
 from models import DetectedFile
+from http_client import get_http_client
 import zipfile
 from urllib.parse import urlparse
 import uuid
 
 class FileDownloader:
     def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        })
+        self.http = get_http_client()
+        self.session = self.http.session()
+        
+        # Read buffer sizes; the buffer is allocated once and reused for every download
+        self.min_chunk_size = app.config['DOWNLOAD_MIN_CHUNK_SIZE']
+        self.max_chunk_size = app.config['DOWNLOAD_MAX_CHUNK_SIZE']
+        self._buffer = None
     
     def download_file(self, detected_file):
-        """Download a single file"""
+        """Download a single file into DOWNLOAD_FOLDER and return its path.
+        
+        The caller records the result: the download queue only marks the file
+        completed while the worker still holds the job's lease.
+        """
         try:
-            # Update download status
-            detected_file.download_status = 'downloading'
-            db.session.commit()
-            
-            response = self.session.get(detected_file.url, stream=True, timeout=30)
-            response.raise_for_status()
-            
-            # Generate unique filename
-            safe_filename = self._get_safe_filename(detected_file.filename)
-            file_path = os.path.join(app.config['DOWNLOAD_FOLDER'], safe_filename)
-            
-            # Ensure unique filename
-            counter = 1
-            base_name, ext = os.path.splitext(file_path)
-            while os.path.exists(file_path):
-                file_path = f"{base_name}_{counter}{ext}"
-                counter += 1
-            
-            # Download file
-            with open(file_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-            
-            # Update database
-            detected_file.download_status = 'completed'
-            detected_file.download_path = file_path
-            db.session.commit()
-            
-            return file_path
+            # Closing the response on the way out returns the connection even if
+            # the status check fails before the body is read
+            with self.session.get(detected_file.url, stream=True, timeout=self.http.timeout()) as response:
+                response.raise_for_status()
+                
+                # Generate safe filename
+                safe_filename = self._get_safe_filename(detected_file.filename)
+                return self._write_response(response, os.path.join(app.config['DOWNLOAD_FOLDER'], safe_filename))
             
         except Exception as e:
             logging.error(f"Error downloading file {detected_file.url}: {str(e)}")
-            detected_file.download_status = 'error'
-            db.session.commit()
             raise e
     
     def create_zip_download(self, files, source_url):
@@ -66,11 +49,10 @@ class FileDownloader:
             with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
                 for detected_file in files:
                     try:
-                        # Download file if not already downloaded
+                        # Files are downloaded by the workers; skip any that aren't ready
                         if detected_file.download_status != 'completed' or not detected_file.download_path:
-                            file_path = self.download_file(detected_file)
-                        else:
-                            file_path = detected_file.download_path
+                            continue
+                        file_path = detected_file.download_path
                         
                         # Add to zip if file exists
                         if file_path and os.path.exists(file_path):
@@ -88,6 +70,134 @@ class FileDownloader:
             logging.error(f"Error creating zip archive: {str(e)}")
             raise e
     
+    def _write_response(self, response, file_path):
+        """Stream a response body to disk and atomically move it into place. Returns the final path."""
+        folder = os.path.dirname(file_path)
+        # Create with 0o666 so the umask applies, as open() would; mkstemp forces 0o600
+        temp_path = os.path.join(folder, f".{uuid.uuid4().hex}.part")
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+        
+        try:
+            with open(fd, 'wb', buffering=0) as f:
+                content_length = self._get_content_length(response)
+                if content_length:
+                    self._preallocate(f, content_length)
+                
+                written = self._copy_body(response, f, content_length)
+                if content_length and written != content_length:
+                    raise IOError(f"Incomplete download: got {written} of {content_length} bytes")
+                
+                # Drop any preallocated space we didn't use, then make the data durable
+                f.truncate(written)
+                os.fsync(f.fileno())
+            
+            # Reserve the name first so concurrent workers can't overwrite each other's files
+            final_path = self._reserve_unique_path(file_path)
+            os.replace(temp_path, final_path)
+            self._fsync_directory(folder)
+            
+            # Body was read to the end, so the connection can go back to the pool
+            response.raw.release_conn()
+            return final_path
+            
+        except BaseException:
+            response.close()
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+    
+    def _copy_body(self, response, f, content_length):
+        """Copy the response body into an unbuffered file and return the number of bytes written"""
+        encoding = response.headers.get('content-encoding', 'identity').lower()
+        fp = getattr(response.raw, '_fp', None)
+        
+        if encoding in ('', 'identity') and hasattr(fp, 'readinto'):
+            return self._copy_readinto(fp, f, content_length)
+        
+        # Compressed bodies have to go through urllib3's decoder
+        written = 0
+        for chunk in response.iter_content(chunk_size=self.max_chunk_size):
+            if chunk:
+                self._write_all(f, chunk)
+                written += len(chunk)
+        return written
+    
+    def _copy_readinto(self, fp, f, content_length):
+        """Read straight from the socket into the reusable buffer, growing reads while they fill up"""
+        if self._buffer is None:
+            self._buffer = bytearray(self.max_chunk_size)
+        view = memoryview(self._buffer)
+        
+        chunk_size = self.min_chunk_size
+        if content_length:
+            chunk_size = max(self.min_chunk_size, min(self.max_chunk_size, content_length // 16))
+        
+        written = 0
+        while True:
+            n = fp.readinto(view[:chunk_size])
+            if not n:
+                break
+            
+            self._write_all(f, view[:n])
+            written += n
+            
+            if n == chunk_size and chunk_size < self.max_chunk_size:
+                chunk_size = min(chunk_size * 2, self.max_chunk_size)
+        
+        return written
+    
+    def _write_all(self, f, data):
+        """Write all of data to an unbuffered file, which may accept fewer bytes per call"""
+        view = memoryview(data)
+        while view:
+            n = f.write(view)
+            view = view[n:]
+    
+    def _get_content_length(self, response):
+        """Return the body length on disk if the server told us, otherwise None"""
+        if response.headers.get('content-encoding', 'identity').lower() not in ('', 'identity'):
+            return None
+        try:
+            content_length = int(response.headers.get('content-length', ''))
+        except ValueError:
+            return None
+        return content_length if content_length > 0 else None
+    
+    def _preallocate(self, f, size):
+        """Reserve disk space up front so the file is laid out contiguously"""
+        if not hasattr(os, 'posix_fallocate'):
+            return
+        try:
+            os.posix_fallocate(f.fileno(), 0, size)
+        except OSError as e:
+            # Not every filesystem supports it; the download still works without it
+            logging.debug(f"posix_fallocate unavailable: {str(e)}")
+    
+    def _fsync_directory(self, folder):
+        """Persist the rename of a file into folder"""
+        try:
+            dir_fd = os.open(folder, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(dir_fd)
+        except OSError:
+            pass
+        finally:
+            os.close(dir_fd)
+    
+    def _reserve_unique_path(self, file_path):
+        """Create an empty file at file_path, or with a counter appended if taken, and return its path"""
+        counter = 1
+        base_name, ext = os.path.splitext(file_path)
+        while True:
+            try:
+                os.close(os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666))
+                return file_path
+            except FileExistsError:
+                file_path = f"{base_name}_{counter}{ext}"
+                counter += 1
+    
     def _get_safe_filename(self, filename):
         """Generate a safe filename for the filesystem"""
         # Remove or replace unsafe characters
@@ -1,3 +1,4 @@
+import io
 import requests
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin, urlparse
@@ -6,14 +7,15 @@ import logging
 from PIL import Image
 import os
 from app import app
+from http_client import get_http_client
+from host_health import get_host_health, HostUnavailableError
 import uuid
 
 class FileAnalyzer:
     def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        })
+        self.http = get_http_client()
+        self.session = self.http.session()
+        self.host_health = get_host_health()
         
         # File type mappings - enhanced for better video detection
         self.image_extensions = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', '.svg', '.ico', '.tiff', '.heic', '.avif'}
@@ -41,7 +43,7 @@ class FileAnalyzer:
     def analyze_url(self, url):
         """Analyze a URL and return list of downloadable files"""
         try:
-            response = self.session.get(url, timeout=30)
+            response = self.session.get(url, timeout=self.http.timeout())
             response.raise_for_status()
             
             soup = BeautifulSoup(response.content, 'html.parser')
@@ -281,14 +283,21 @@ class FileAnalyzer:
                 return None
             
             # Get file metadata
+            host_unavailable = False
             try:
-                head_response = self.session.head(file_url, timeout=10)
+                head_response = self._request('HEAD', file_url, read_timeout=10)
                 file_size = head_response.headers.get('content-length')
                 mime_type = head_response.headers.get('content-type')
                 
                 if file_size:
                     file_size = int(file_size)
                 
+            except (HostUnavailableError, requests.ConnectionError, requests.Timeout) as e:
+                # Host is down or tarpitting; don't wait on it again for the preview
+                logging.info(f"Skipping metadata for {file_url}: {str(e)}")
+                host_unavailable = True
+                file_size = None
+                mime_type = mimetypes.guess_type(file_url)[0]
             except:
                 file_size = None
                 mime_type = mimetypes.guess_type(file_url)[0]
@@ -299,13 +308,18 @@ class FileAnalyzer:
                 'type': file_type,
                 'mime_type': mime_type,
                 'size': file_size,
-                'preview_path': None
+                'preview_path': None,
+                'host_unavailable': host_unavailable
             }
             
             # Generate preview for images
-            if file_type == 'image':
-                preview_path = self._generate_image_preview(file_url, filename)
-                file_info['preview_path'] = preview_path
+            if file_type == 'image' and not host_unavailable:
+                try:
+                    file_info['preview_path'] = self._generate_image_preview(file_url, filename)
+                except HostUnavailableError as e:
+                    # Breaker opened since the HEAD succeeded
+                    logging.info(f"Skipping preview for {file_url}: {str(e)}")
+                    file_info['host_unavailable'] = True
             
             return file_info
             
@@ -313,6 +327,32 @@ class FileAnalyzer:
             logging.error(f"Error analyzing file URL {file_url}: {str(e)}")
             return None
     
+    def _request(self, method, url, read_timeout=None):
+        """Send a request through the host's circuit breaker with a timeout adapted to its latency"""
+        host = self.host_health.get(url)
+        if not host.allow_request():
+            raise HostUnavailableError(host.host)
+        
+        timeout = host.timeout(self.http.timeout(read_timeout))
+        try:
+            # Like session.head(), HEAD doesn't follow redirects; GET does
+            response = self.session.request(method, url, timeout=timeout,
+                                            allow_redirects=method.upper() != 'HEAD')
+        except (requests.ConnectionError, requests.Timeout):
+            host.record_failure()
+            raise
+        except Exception:
+            host.cancel_request()
+            raise
+        
+        # Only gateway/overload errors say the host is unhealthy; plenty of working
+        # servers answer 500 or 501 to HEAD
+        if response.status_code in (502, 503, 504):
+            host.record_failure()
+        else:
+            host.record_success(response.elapsed.total_seconds())
+        return response
+    
     def _get_file_type(self, extension, url):
         """Determine file type based on extension and URL"""
         if extension in self.image_extensions:
@@ -351,7 +391,7 @@ class FileAnalyzer:
     def _generate_image_preview(self, image_url, filename):
         """Generate a thumbnail preview for an image"""
         try:
-            response = self.session.get(image_url, timeout=30)
+            response = self._request('GET', image_url)
             response.raise_for_status()
             
             # Create unique preview filename
@@ -359,7 +399,7 @@ class FileAnalyzer:
             preview_path = os.path.join(app.config['PREVIEW_FOLDER'], preview_filename)
             
             # Open and resize image
-            with Image.open(requests.get(image_url, stream=True).raw) as img:
+            with Image.open(io.BytesIO(response.content)) as img:
                 # Convert to RGB if necessary
                 if img.mode in ('RGBA', 'LA', 'P'):
                     img = img.convert('RGB')
@@ -370,6 +410,8 @@ class FileAnalyzer:
             
             return preview_path
             
+        except HostUnavailableError:
+            raise
         except Exception as e:
             logging.error(f"Error generating preview for {image_url}: {str(e)}")
             return None
@@ -0,0 +1,164 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from urllib.parse import urlparse
+from app import app
+
+class HostUnavailableError(Exception):
+    """Raised instead of sending a request to a host whose circuit breaker is open"""
+
+    def __init__(self, host):
+        super().__init__(f"Host {host} is temporarily unavailable")
+        self.host = host
+
+class HostHealth:
+    """Latency, error rate and circuit breaker state for a single host"""
+
+    def __init__(self, host, registry):
+        self.host = host
+        self.registry = registry
+        self.latencies = deque(maxlen=registry.window)
+        self.outcomes = deque(maxlen=registry.window)  # True for success, False for failure
+        self.consecutive_failures = 0
+        self.state = 'closed'  # closed, open, half_open
+        self.opened_at = None
+        self.times_opened = 0
+        self.probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        """Return True if a request may be sent; an open breaker lets one probe through after the cooldown"""
+        with self._lock:
+            if self.state == 'closed':
+                return True
+
+            if self.state == 'open':
+                if time.monotonic() - self.opened_at < self.registry.cooldown:
+                    return False
+                self.state = 'half_open'
+                self.probe_in_flight = False
+
+            if self.probe_in_flight:
+                return False
+            self.probe_in_flight = True
+            return True
+
+    def record_success(self, latency):
+        with self._lock:
+            self.latencies.append(latency)
+            self.outcomes.append(True)
+            self.consecutive_failures = 0
+            self.state = 'closed'
+            self.opened_at = None
+            self.probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.outcomes.append(False)
+            self.consecutive_failures += 1
+            self.probe_in_flight = False
+
+            if self.state == 'half_open' or (self.state == 'closed' and
+                                             self.consecutive_failures >= self.registry.failure_threshold):
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+                self.times_opened += 1
+
+    def cancel_request(self):
+        """Forget a request that failed before reaching the host, e.g. an invalid URL"""
+        with self._lock:
+            self.probe_in_flight = False
+
+    def timeout(self, default):
+        """Derive a (connect, read) timeout from observed latency, never above the default"""
+        connect_default, read_default = default
+        with self._lock:
+            if len(self.latencies) < self.registry.min_samples:
+                return default
+            p99 = self._percentile(99)
+
+        adaptive = max(self.registry.min_timeout, p99 * self.registry.timeout_multiplier)
+        return (min(connect_default, adaptive), min(read_default, adaptive))
+
+    def stats(self):
+        with self._lock:
+            failures = sum(1 for ok in self.outcomes if not ok)
+            return {
+                'host': self.host,
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'times_opened': self.times_opened,
+                'requests': len(self.outcomes),
+                'error_rate': round(failures / len(self.outcomes), 3) if self.outcomes else None,
+                'latency_p50': self._percentile(50),
+                'latency_p95': self._percentile(95),
+                'latency_p99': self._percentile(99),
+                'open_for': round(time.monotonic() - self.opened_at, 1) if self.opened_at else None,
+            }
+
+    def _percentile(self, percentile):
+        """Nearest-rank percentile of the latency window; caller holds the lock"""
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        index = max(0, -(-len(ordered) * percentile // 100) - 1)
+        return round(ordered[index], 4)
+
+class HostHealthRegistry:
+    """Process-wide HostHealth records, shared by every analysis"""
+
+    def __init__(self, failure_threshold, cooldown, window, min_samples, min_timeout, timeout_multiplier,
+                 max_hosts=1024):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.window = window
+        self.min_samples = min_samples
+        self.min_timeout = min_timeout
+        self.timeout_multiplier = timeout_multiplier
+        self.max_hosts = max_hosts
+        self._hosts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        """Return the HostHealth for the host of url, creating it if needed"""
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            health = self._hosts.get(host)
+            if health is None:
+                health = HostHealth(host, self)
+                self._hosts[host] = health
+                # Forget the least recently used hosts
+                while len(self._hosts) > self.max_hosts:
+                    self._hosts.popitem(last=False)
+            else:
+                self._hosts.move_to_end(host)
+            return health
+
+    def stats(self):
+        with self._lock:
+            hosts = list(self._hosts.values())
+        host_stats = [health.stats() for health in hosts]
+        return {
+            'failure_threshold': self.failure_threshold,
+            'cooldown': self.cooldown,
+            'open': [stats['host'] for stats in host_stats if stats['state'] != 'closed'],
+            'hosts': host_stats,
+        }
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_host_health():
+    """Return the process-wide HostHealthRegistry, creating it on first use"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = HostHealthRegistry(
+                failure_threshold=app.config['HOST_FAILURE_THRESHOLD'],
+                cooldown=app.config['HOST_BREAKER_COOLDOWN'],
+                window=app.config['HOST_LATENCY_WINDOW'],
+                min_samples=app.config['HOST_MIN_SAMPLES'],
+                min_timeout=app.config['HOST_MIN_TIMEOUT'],
+                timeout_multiplier=app.config['HOST_TIMEOUT_MULTIPLIER'],
+            )
+        return _registry
@@ -0,0 +1,146 @@
+import socket
+import threading
+import time
+from collections import OrderedDict
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+from app import app
+
+# Browser-like headers sent with every request. ACCEPT_ENCODING adds br because
+# brotli is a dependency (and zstd if zstandard happens to be installed).
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept-Encoding': ACCEPT_ENCODING,
+}
+
+class DnsCache:
+    """TTL cache in front of socket.getaddrinfo for the whole process"""
+
+    def __init__(self, ttl, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._getaddrinfo = socket.getaddrinfo
+
+    def install(self):
+        socket.getaddrinfo = self.getaddrinfo
+
+    def getaddrinfo(self, host, port, family=0, type=0, proto=0, flags=0):
+        key = (host, port, family, type, proto, flags)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return entry[1]
+            if entry:
+                del self._entries[key]
+
+        # Resolve outside the lock; failures are not cached
+        result = self._getaddrinfo(host, port, family, type, proto, flags)
+
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = (now + self.ttl, result)
+            self._entries.move_to_end(key)
+            # Forget the least recently used lookups
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {
+                'ttl': self.ttl,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+class HttpClient:
+    """Process-wide connection pools shared by every requests session we create"""
+
+    def __init__(self, pool_hosts, pool_maxsize, connect_timeout, read_timeout, dns_cache_ttl, dns_cache_size):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.adapter = HTTPAdapter(pool_connections=pool_hosts, pool_maxsize=pool_maxsize)
+
+        self.dns_cache = None
+        if dns_cache_ttl > 0:
+            self.dns_cache = DnsCache(dns_cache_ttl, dns_cache_size)
+            self.dns_cache.install()
+
+    def session(self):
+        """Return a new session (with its own cookies) backed by the shared pools.
+
+        Don't close the returned session: that would close the shared pools.
+        """
+        session = requests.Session()
+        session.mount('http://', self.adapter)
+        session.mount('https://', self.adapter)
+        session.headers.update(DEFAULT_HEADERS)
+        return session
+
+    def timeout(self, read=None):
+        """Return a (connect, read) timeout tuple, optionally overriding the read timeout"""
+        return (self.connect_timeout, read or self.read_timeout)
+
+    def stats(self):
+        """Return pool utilization and connection reuse per host"""
+        pools = self.adapter.poolmanager.pools
+        hosts = []
+
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None or pool.pool is None:
+                continue
+
+            # Empty slots in the queue are None; anything else is an idle connection
+            queued = list(pool.pool.queue)
+            idle = sum(1 for conn in queued if conn is not None)
+            hosts.append({
+                'host': f"{pool.scheme}://{pool.host}:{pool.port}",
+                'maxsize': pool.pool.maxsize,
+                'in_use': max(0, pool.pool.maxsize - len(queued)),
+                'idle': idle,
+                'connections_opened': pool.num_connections,
+                'requests': pool.num_requests,
+                'connections_reused': max(0, pool.num_requests - pool.num_connections),
+            })
+
+        total_requests = sum(host['requests'] for host in hosts)
+        total_reused = sum(host['connections_reused'] for host in hosts)
+        return {
+            'pool_hosts': {'size': len(pools), 'maxsize': pools._maxsize},
+            'requests': total_requests,
+            'connections_opened': sum(host['connections_opened'] for host in hosts),
+            'reuse_ratio': round(total_reused / total_requests, 3) if total_requests else None,
+            'hosts': hosts,
+            'dns_cache': self.dns_cache.stats() if self.dns_cache else None,
+            'timeouts': {'connect': self.connect_timeout, 'read': self.read_timeout},
+        }
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_http_client():
+    """Return the process-wide HttpClient, creating it on first use"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient(
+                pool_hosts=app.config['HTTP_POOL_HOSTS'],
+                pool_maxsize=app.config['HTTP_POOL_MAXSIZE'],
+                connect_timeout=app.config['HTTP_CONNECT_TIMEOUT'],
+                read_timeout=app.config['HTTP_READ_TIMEOUT'],
+                dns_cache_ttl=app.config['HTTP_DNS_CACHE_TTL'],
+                dns_cache_size=app.config['HTTP_DNS_CACHE_SIZE'],
+            )
+        return _client
@@ -22,7 +22,7 @@ class DetectedFile(db.Model):
     mime_type = db.Column(db.String(100))
     file_size = db.Column(db.BigInteger)  # Size in bytes
     preview_path = db.Column(db.String(512))  # Path to preview file
-    download_status = db.Column(db.String(50), default='pending')  # pending, downloading, completed, error
+    download_status = db.Column(db.String(50), default='pending')  # pending, deferred, queued, downloading, completed, error
     download_path = db.Column(db.String(512))  # Path to downloaded file
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -37,3 +37,24 @@ class DetectedFile(db.Model):
                 return f"{size:.1f} {unit}"
             size /= 1024.0
         return f"{size:.1f} TB"
+
+class DownloadJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    file_id = db.Column(db.Integer, db.ForeignKey('detected_file.id'), nullable=False, unique=True)
+    status = db.Column(db.String(50), default='queued', nullable=False)  # queued, running, completed, failed
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    max_attempts = db.Column(db.Integer, default=5, nullable=False)
+    lease_owner = db.Column(db.String(128))  # Worker currently holding the job
+    lease_expires_at = db.Column(db.DateTime)  # Job is reclaimable once this passes
+    heartbeat_at = db.Column(db.DateTime)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    last_error = db.Column(Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Relationship to the file being downloaded
+    file = db.relationship('DetectedFile', backref=db.backref('download_job', uselist=False, cascade='all, delete-orphan'))
+    
+    __table_args__ = (
+        db.Index('ix_download_job_claim', 'status', 'next_attempt_at'),
+    )
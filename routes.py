@@ -3,7 +3,11 @@ from app import app, db
 from models import AnalysisSession, DetectedFile
 from file_analyzer import FileAnalyzer
 from downloader import FileDownloader
+from download_queue import DownloadQueue
+from http_client import get_http_client
+from host_health import get_host_health
 import os
+import hmac
 import uuid
 from urllib.parse import urlparse
 import logging
@@ -53,7 +57,9 @@ def analyze_url():
                 file_type=file_info['type'],
                 mime_type=file_info.get('mime_type'),
                 file_size=file_info.get('size'),
-                preview_path=file_info.get('preview_path')
+                preview_path=file_info.get('preview_path'),
+                # Host was failing during analysis, so metadata and preview were skipped
+                download_status='deferred' if file_info.get('host_unavailable') else 'pending'
             )
             db.session.add(detected_file)
         
@@ -103,20 +109,22 @@ def download_file(file_id):
     if analysis.session_id != session.get('session_id'):
         abort(403)
     
+    queue = DownloadQueue()
+    if queue.is_ready(detected_file):
+        return send_file(detected_file.download_path, as_attachment=True, download_name=detected_file.filename)
+    
     try:
-        downloader = FileDownloader()
-        file_path = downloader.download_file(detected_file)
-        
-        if file_path and os.path.exists(file_path):
-            return send_file(file_path, as_attachment=True, download_name=detected_file.filename)
+        # Downloads run in worker processes; queue it and let the user come back for it
+        job = queue.enqueue(detected_file)
+        if job is not None and job.status == 'completed':
+            flash(f'{detected_file.filename} was downloaded but the file is not available on this server', 'error')
         else:
-            flash('Error downloading file', 'error')
-            return redirect(url_for('results', analysis_id=detected_file.session_id))
-            
+            flash(f'{detected_file.filename} has been queued for download. Click Download again once it is ready.', 'success')
     except Exception as e:
-        logging.error(f"Error downloading file: {str(e)}")
-        flash(f'Error downloading file: {str(e)}', 'error')
-        return redirect(url_for('results', analysis_id=detected_file.session_id))
+        logging.error(f"Error queueing download: {str(e)}")
+        flash(f'Error queueing download: {str(e)}', 'error')
+    
+    return redirect(url_for('results', analysis_id=detected_file.session_id))
 
 @app.route('/preview/<int:file_id>')
 def preview_file(file_id):
@@ -144,8 +152,15 @@ def download_all(analysis_id):
     files = DetectedFile.query.filter_by(session_id=analysis_id).all()
     
     try:
+        queue = DownloadQueue()
+        outstanding = queue.enqueue_many(files)
+        
+        if outstanding:
+            flash(f'{outstanding} files queued for download. Click Download All again once they are ready.', 'success')
+            return redirect(url_for('results', analysis_id=analysis_id))
+        
         downloader = FileDownloader()
-        zip_path = downloader.create_zip_download(files, analysis.url)
+        zip_path = downloader.create_zip_download([f for f in files if queue.is_ready(f)], analysis.url)
         
         if zip_path and os.path.exists(zip_path):
             return send_file(zip_path, as_attachment=True, download_name=f"downloaded_files_{analysis_id}.zip")
@@ -158,6 +173,23 @@ def download_all(analysis_id):
         flash(f'Error creating download archive: {str(e)}', 'error')
         return redirect(url_for('results', analysis_id=analysis_id))
 
+def require_admin():
+    """Abort unless the X-Admin-Token header carries the configured admin token"""
+    token = app.config.get('ADMIN_TOKEN')
+    supplied = request.headers.get('X-Admin-Token', '')
+    if not token or not hmac.compare_digest(supplied, token):
+        abort(403)
+
+@app.route('/admin/http-stats')
+def http_stats():
+    require_admin()
+    return jsonify(get_http_client().stats())
+
+@app.route('/admin/host-health')
+def host_health():
+    require_admin()
+    return jsonify(get_host_health().stats())
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('base.html', error_message="Page not found"), 404
@@ -0,0 +1,150 @@
+"""Standalone download worker.
+
+Claims queued download jobs from the database and runs them outside of the
+web process. Start any number of workers, on one machine or many, pointing
+at the same DATABASE_URL:
+
+    python worker.py
+    python worker.py --processes 4
+
+Workers save files under DOWNLOAD_FOLDER and the web app serves them from
+there, so when workers run on other machines DOWNLOAD_FOLDER must be shared
+storage (e.g. an NFS mount) at the same path on every machine.
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import uuid
+import requests
+from app import app, db
+from download_queue import DownloadQueue
+from downloader import FileDownloader
+
+class DownloadWorker:
+    def __init__(self, worker_id=None, poll_interval=2.0):
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.poll_interval = poll_interval
+        self.heartbeat_seconds = app.config['DOWNLOAD_HEARTBEAT_SECONDS']
+        self.queue = DownloadQueue()
+        self.downloader = FileDownloader()
+        self._stop = threading.Event()
+
+    def stop(self, *args):
+        """Finish the current job and then exit"""
+        logging.info(f"Worker {self.worker_id} stopping")
+        self._stop.set()
+
+    def run(self, exit_when_idle=False, max_jobs=None):
+        """Claim and process jobs until stopped. Returns the number of jobs processed."""
+        logging.info(f"Worker {self.worker_id} started")
+        processed = 0
+
+        while not self._stop.is_set():
+            if max_jobs is not None and processed >= max_jobs:
+                break
+
+            try:
+                job = self.queue.claim(self.worker_id)
+            except Exception as e:
+                logging.error(f"Worker {self.worker_id} failed to claim a job: {str(e)}")
+                db.session.rollback()
+                job = None
+
+            if job is None:
+                if exit_when_idle:
+                    break
+                self._stop.wait(self.poll_interval)
+                continue
+
+            self._process(job)
+            processed += 1
+
+        db.session.remove()
+        logging.info(f"Worker {self.worker_id} exiting after {processed} jobs")
+        return processed
+
+    def _process(self, job):
+        """Run a single claimed job while keeping its lease alive"""
+        if job.attempts > job.max_attempts:
+            # Lease expired on the final attempt; the previous worker died mid-download
+            self.queue.fail(job, self.worker_id, job.last_error or 'Worker lease expired', retry=False)
+            return
+
+        heartbeat_stop = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job.id, heartbeat_stop), daemon=True)
+        heartbeat.start()
+
+        try:
+            file_path = self.downloader.download_file(job.file)
+            if not self.queue.complete(job, self.worker_id, file_path):
+                # Another worker owns the job now and records its own copy
+                os.unlink(file_path)
+        except Exception as e:
+            retrying = self.queue.fail(job, self.worker_id, str(e), retry=self._is_retryable(e))
+            logging.error(f"Download job {job.id} attempt {job.attempts} failed"
+                          f"{', will retry' if retrying else ''}: {str(e)}")
+        finally:
+            heartbeat_stop.set()
+            heartbeat.join()
+
+    def _is_retryable(self, error):
+        """Client errors such as 404 or 403 won't go away on retry; timeouts and rate limits might"""
+        if isinstance(error, requests.HTTPError) and error.response is not None:
+            status = error.response.status_code
+            return not (400 <= status < 500) or status in (408, 429)
+        return True
+
+    def _heartbeat(self, job_id, heartbeat_stop):
+        """Extend the job lease until the download finishes"""
+        with app.app_context():
+            while not heartbeat_stop.wait(self.heartbeat_seconds):
+                try:
+                    if not self.queue.heartbeat(job_id, self.worker_id):
+                        logging.warning(f"Worker {self.worker_id} lost the lease on download job {job_id}")
+                        return
+                except Exception as e:
+                    logging.error(f"Heartbeat for download job {job_id} failed: {str(e)}")
+
+def run_worker(poll_interval, exit_when_idle, max_jobs):
+    with app.app_context():
+        worker = DownloadWorker(poll_interval=poll_interval)
+        signal.signal(signal.SIGTERM, worker.stop)
+        signal.signal(signal.SIGINT, worker.stop)
+        worker.run(exit_when_idle=exit_when_idle, max_jobs=max_jobs)
+
+def main():
+    parser = argparse.ArgumentParser(description='Run download workers')
+    parser.add_argument('--processes', type=int, default=1, help='Number of worker processes to start')
+    parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds to wait when the queue is empty')
+    parser.add_argument('--exit-when-idle', action='store_true', help='Exit once no jobs are runnable')
+    parser.add_argument('--max-jobs', type=int, default=None, help='Exit after processing this many jobs')
+    args = parser.parse_args()
+
+    worker_args = (args.poll_interval, args.exit_when_idle, args.max_jobs)
+    if args.processes <= 1:
+        run_worker(*worker_args)
+        return
+
+    # Spawn rather than fork so children don't share the parent's database connections
+    context = multiprocessing.get_context('spawn')
+    processes = [context.Process(target=run_worker, args=worker_args) for _ in range(args.processes)]
+    for process in processes:
+        process.start()
+
+    def forward_signal(signum, frame):
+        for process in processes:
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, forward_signal)
+    signal.signal(signal.SIGINT, forward_signal)
+
+    for process in processes:
+        process.join()
+
+if __name__ == '__main__':
+    main()